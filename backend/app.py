@@ -1,14 +1,20 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, stream_with_context
 from flask_cors import CORS
 import csv
+import json
+import os
+import time
+import unicodedata
 from io import StringIO
-from functools import lru_cache
-import urllib.request
-import urllib.error
+from functools import lru_cache, partial
+import urllib3
 
 app = Flask(__name__)
 CORS(app)
 
+# Shared connection pool so repeated fetches to the same host reuse keep-alive sockets
+HTTP = urllib3.PoolManager(maxsize=8, retries=urllib3.Retry(3, backoff_factor=0.2))
+
 @app.route("/api/hello")
 def hello():
     return jsonify(message="Hello from Flask!")
@@ -16,30 +22,111 @@ def hello():
 # Raw CSV listing ADM1 codes/names from GFDRR (used by thinkhazard)
 ADM1_CSV_URL = "https://raw.githubusercontent.com/GFDRR/thinkhazardmethods/master/source/download/ADM1_TH.csv"
 
+# Local copy of the parsed mapping, revalidated against the upstream ETag.
+# Bump the version whenever the key normalization changes so stale caches are ignored.
+ADM1_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "adm1_cache.json")
+ADM1_CACHE_VERSION = 3
+
+
+def _normalize_name(name):
+    """Lowercase and strip diacritics so e.g. 'São Paulo' and 'sao paulo' map to the same key."""
+    return unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().strip().lower()
+
+
+def _read_adm1_cache():
+    """Return the cached {"etag": ..., "mapping": {...}} dict, or None if missing/unreadable."""
+    try:
+        with open(ADM1_CACHE_PATH, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        if cache.get("version") == ADM1_CACHE_VERSION and isinstance(cache.get("mapping"), dict):
+            return cache
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _write_adm1_cache(etag, mapping):
+    """Atomically rewrite the on-disk cache so a crash never leaves a half-written file."""
+    tmp_path = ADM1_CACHE_PATH + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": ADM1_CACHE_VERSION, "etag": etag, "mapping": mapping}, f)
+        os.replace(tmp_path, ADM1_CACHE_PATH)
+    except OSError as e:
+        app.logger.warning("failed to write ADM1 cache: %s", e)
+
+
+def _parse_adm1_csv(text):
+    """Parse the semicolon-delimited ADM1 CSV into a normalized name -> ADM1_CODE dict."""
+    reader = csv.reader(StringIO(text), delimiter=";")
+    # Skip header row
+    next(reader, None)
+    mapping = {}
+    for row in reader:
+        if len(row) < 2 or not row[0].strip():
+            continue
+        # Names with no ASCII letters (e.g. fully non-Latin scripts) normalize to "" and are
+        # skipped, rather than all colliding on one empty key
+        key = _normalize_name(row[1])
+        if key:
+            mapping[key] = row[0].strip()
+    return mapping
+
+
 @lru_cache(maxsize=1)
 def load_adm1_mapping():
-    """Fetch the ADM1 CSV and return a dict mapping lowercase name -> ADM1_CODE (as string)."""
+    """Fetch the ADM1 CSV and return a dict mapping normalized name -> ADM1_CODE (as string).
+
+    The parsed mapping is cached on disk together with the upstream ETag; on startup a
+    conditional GET is issued and a 304 reuses the cached mapping without re-downloading.
+    """
+    cache = _read_adm1_cache()
+    headers = {}
+    if cache and cache.get("etag"):
+        headers["If-None-Match"] = cache["etag"]
     try:
-        with urllib.request.urlopen(ADM1_CSV_URL, timeout=10) as resp:
-            raw = resp.read()
-            text = raw.decode("utf-8")
-        # CSV uses semicolon delimiter
-        reader = csv.DictReader(StringIO(text), fieldnames=["ADM1_CODE", "ADM1_NAME", "ADM0_CODE", "ADM0_NAME"], delimiter=";")
-        mapping = {}
-        for row in reader:
-            # Skip header if present
-            if row["ADM1_CODE"] == "ADM1_CODE":
-                continue
-            code = row["ADM1_CODE"].strip()
-            name = row["ADM1_NAME"] or ""
-            name = name.strip()
-            if not code or not name:
-                continue
-            mapping[name.lower()] = code
+        resp = HTTP.request("GET", ADM1_CSV_URL, headers=headers, timeout=10, preload_content=True)
+        if resp.status == 304 and cache:
+            return cache["mapping"]
+        if resp.status != 200:
+            raise urllib3.exceptions.HTTPError(f"HTTP {resp.status} fetching ADM1 CSV")
+        mapping = _parse_adm1_csv(resp.data.decode("utf-8"))
+        _write_adm1_cache(resp.headers.get("ETag"), mapping)
         return mapping
     except Exception as e:
         app.logger.error("failed to load ADM1 CSV: %s", e)
-        return {}
+        # Fall back to a stale copy rather than failing every lookup
+        return cache["mapping"] if cache else {}
+
+
+# In-memory cache of proxied GeoJSON bodies: ADM1 code -> (expires_at, body)
+GEOJSON_CACHE_TTL = 3600
+_geojson_cache = {}
+
+
+def _cache_geojson(code, body):
+    now = time.monotonic()
+    # Drop expired entries so the cache only holds recently requested regions
+    for k in [k for k, (expires_at, _) in _geojson_cache.items() if expires_at <= now]:
+        _geojson_cache.pop(k, None)
+    _geojson_cache[code] = (now + GEOJSON_CACHE_TTL, body)
+
+
+def _stream_upstream(resp, chunk_size=65536, on_complete=None):
+    """Yield an upstream urllib3 response body in chunks, returning the connection to the pool when done.
+
+    If on_complete is given, it is called with the full body once the stream finishes.
+    """
+    chunks = [] if on_complete else None
+    try:
+        for chunk in resp.stream(chunk_size):
+            if chunks is not None:
+                chunks.append(chunk)
+            yield chunk
+        if chunks is not None:
+            on_complete(b"".join(chunks))
+    finally:
+        resp.release_conn()
 
 
 @app.route("/api/thinkhazard/<city>")
@@ -52,25 +139,34 @@ def thinkhazard_city_geojson(city):
     if not mapping:
         return jsonify(error="ADM1 mapping not available"), 500
 
-    key = city.replace("-", " ").strip().lower()
-    code = mapping.get(key)
-    # Try a looser match: exact capitalizations or removing diacritics could be added later
-    if not code:
-        # try title-case matching against keys
-        for name, c in mapping.items():
-            if name.lower() == key:
-                code = c
-                break
+    # Keys are case- and accent-normalized, so a single dict lookup covers looser spellings
+    key = _normalize_name(city.replace("-", " "))
+    code = mapping.get(key) if key else None
     if not code:
         return jsonify(error="city not found", city=city), 404
 
+    cache_headers = {"Cache-Control": f"public, max-age={GEOJSON_CACHE_TTL}"}
+    cached = _geojson_cache.get(code)
+    if cached and cached[0] > time.monotonic():
+        return Response(cached[1], status=200, content_type="application/json", headers=cache_headers)
+
     geojson_url = f"https://thinkhazard.org/en/report/{code}/TS.geojson"
     try:
-        with urllib.request.urlopen(geojson_url, timeout=10) as resp:
-            content = resp.read()
-            status = resp.getcode() if hasattr(resp, "getcode") else 200
-            return (content, status, {"Content-Type": "application/json"})
-    except urllib.error.HTTPError as he:
+        resp = HTTP.request("GET", geojson_url, timeout=10, preload_content=False)
+        if resp.status != 200:
+            # Upstream error bodies are often HTML or plain text; report them as a JSON 502 instead
+            resp.drain_conn()
+            resp.release_conn()
+            app.logger.error("thinkhazard returned HTTP %s for %s", resp.status, geojson_url)
+            return jsonify(error="upstream error", status=resp.status), 502
+        # Successful bodies are cached once fully streamed to the client
+        return Response(
+            stream_with_context(_stream_upstream(resp, on_complete=partial(_cache_geojson, code))),
+            status=200,
+            content_type="application/json",
+            headers=cache_headers,
+        )
+    except urllib3.exceptions.HTTPError as he:
         app.logger.error("thinkhazard fetch failed: %s", he)
         return jsonify(error="failed to fetch geojson", detail=str(he)), 502
     except Exception as e:
@@ -5,4 +5,4 @@
 python3 -m venv venv
 source venv/bin/activate
 pip install --upgrade pip
-pip install flask flask-cors
\ No newline at end of file
+pip install flask flask-cors urllib3 gunicorn gevent
\ No newline at end of file
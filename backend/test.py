@@ -1,4 +1,5 @@
 import geopandas as gpd
+import shapely
 
 # 1️⃣ Load dataset directly from ThinkHazard
 url = "https://thinkhazard.org/en/report/1690/TS.geojson"
@@ -13,11 +14,12 @@ if gdf.crs is None:
 # 3️⃣ Reproject to latitude/longitude (EPSG:4326)
 gdf = gdf.to_crs("EPSG:4326")
 
-# 4️⃣ Optional: simplify geometry for lighter web maps
-gdf["geometry"] = gdf["geometry"].simplify(tolerance=0.0001, preserve_topology=True)
+# 4️⃣ Optional: snap to ~1 m precision and simplify geometry for lighter web maps
+gdf["geometry"] = shapely.set_precision(gdf.geometry.values, 1e-5)
+gdf["geometry"] = gdf["geometry"].simplify(tolerance=0.001, preserve_topology=True)
 
-# 5️⃣ Export to GeoJSON
+# 5️⃣ Export to GeoJSON (5 decimal places is plenty for display)
 output_path = "tsunami_converted.geojson"
-gdf.to_file(output_path, driver="GeoJSON")
+gdf.to_file(output_path, driver="GeoJSON", COORDINATE_PRECISION=5)
 
 print("✅ Converted GeoJSON saved as:", output_path)
\ No newline at end of file
@@ -0,0 +1,9 @@
+# Production entry point. Run from the backend directory with:
+#   gunicorn -k gevent -w 2 --worker-connections 200 -b 0.0.0.0:5001 wsgi:app
+# The endpoints mostly wait on upstream HTTP, so gevent lets many requests overlap per worker.
+from gevent import monkey
+
+# Patch sockets before app.py creates its urllib3 pool
+monkey.patch_all()
+
+from app import app  # noqa: E402
@@ -2,10 +2,21 @@ import streamlit as st
 import pandas as pd
 import sys
 
-from main_model import compute_damage_score, estimate_loss_from_score, load_data
+from main_model import compute_damage_score, estimate_loss_from_score, fit_normalization, load_data
 
 DATA_PATH = "world_tsunamis.csv"
-df = load_data(DATA_PATH)
+
+@st.cache_data(show_spinner=False)
+def _get_df():
+    # Parsed once and shared across reruns/sessions instead of re-reading the CSV
+    return load_data(DATA_PATH)
+
+df = _get_df()
+
+@st.cache_data(show_spinner=False)
+def _get_norms():
+    # Normalization baseline from the historical data; scenarios are scored against it
+    return fit_normalization(df)
 
 def save_to_json(results_df, filename="tsunami_results.json"):
     results_df.to_json(filename, orient='records', indent=4)
@@ -29,23 +40,15 @@ def run_streamlit_ui():
     )
 
     # --- Run model ---
-    scenario = pd.DataFrame({
-        "Earthquake Magnitude": [magnitude],
-        "Maximum Water Height (m)": [max_height],
-        "Number of Runups": [runups],
-        "Deposits": [deposits],
-    })
-    
     scenario_row = {
-    "Earthquake Magnitude": magnitude,
-    "Maximum Water Height (m)": max_height,
-    "Number of Runups": runups,
-    "Deposits": deposits,
-}
+        "Earthquake Magnitude": magnitude,
+        "Maximum Water Height (m)": max_height,
+        "Number of Runups": runups,
+        "Deposits": deposits,
+    }
     new_scenario_df = pd.DataFrame([scenario_row])
-    df_with_scenario = pd.concat([df,new_scenario_df], ignore_index=True)
-    scored = compute_damage_score(df_with_scenario)
-    damage_score = float(scored["Damage Score"].iloc[-1])
+    scored = compute_damage_score(new_scenario_df, norms=_get_norms())
+    damage_score = float(scored["Damage Score"].iloc[0])
 
     estimated_loss = estimate_loss_from_score(damage_score, total_exposed)
 
@@ -78,17 +81,18 @@ def run_cli_ui():
     "deposits": 0.2
     }
 
-    scenario = pd.DataFrame({
-        "Location": [city],
-        "Earthquake Magnitude": [mag],
-        "Maximum Water Height (m)": [height],
-        "Number of Runups": [runups],
-        "Deposits": [deposits],
-    })
+    result_row = {
+        "Location": city,
+        "Earthquake Magnitude": mag,
+        "Maximum Water Height (m)": height,
+        "Number of Runups": runups,
+        "Deposits": deposits,
+    }
 
-    df_with_scenario = pd.concat([df, scenario], ignore_index=True)
-    scored = compute_damage_score(df_with_scenario)
-    damage_score = float(scored["Damage Score"].iloc[-1])
+    # Score the scenario on its own; the historical data only supplies normalization bounds
+    scenario = pd.DataFrame.from_records([result_row])
+    scored = compute_damage_score(scenario, norms=fit_normalization(df))
+    damage_score = float(scored["Damage Score"].iloc[0])
 
     estimated_loss = estimate_loss_from_score(damage_score, total_exposed)
 
@@ -99,16 +103,9 @@ def run_cli_ui():
     
     save_option = input("Save results to JSON? (y/n): ").strip().lower()
     if save_option == 'y':
-        result_row = pd.DataFrame([{
-            "Location": city,
-            "Earthquake Magnitude": mag,
-            "Maximum Water Height (m)": height,
-            "Number of Runups": runups,
-            "Deposits": deposits,
-            "Damage Score": damage_score,
-            "Estimated Loss": estimated_loss
-        }])
-        save_to_json(result_row)
+        result_row["Damage Score"] = damage_score
+        result_row["Estimated Loss"] = estimated_loss
+        save_to_json(pd.DataFrame.from_records([result_row]))
 
 
 if __name__ == "__main__":
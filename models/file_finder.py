@@ -41,18 +41,21 @@ def city_in_tile(city_lat, city_lon, tile):
     
     return inside_lat and inside_lon
 
+# Extract tile bounds once as contiguous arrays so each city lookup is a few NumPy comparisons
+se_lat = df['SE Corner Lat dec'].to_numpy(dtype=float)
+nw_lat = df['NW Corner Lat dec'].to_numpy(dtype=float)
+nw_lon = df['NW Corner Long dec'].to_numpy(dtype=float)
+ne_lon = df['NE Corner Long dec'].to_numpy(dtype=float)
+tile_ids = df['Entity ID'].to_numpy()
+
 # Find tiles per city
 tiles_to_download = {}
 
 for city, (lat, lon) in CITY_LOCATIONS.items():
-    # Correct filtering — pandas doesn’t understand `a <= x <= b` directly
-    matching_tiles = df[
-        (df['SE Corner Lat dec'] <= lat) & (df['NW Corner Lat dec'] >= lat) &
-        (df['NW Corner Long dec'] <= lon) & (df['NE Corner Long dec'] >= lon)
-    ]
-
-    if not matching_tiles.empty:
-        tiles_to_download[city] = matching_tiles['Entity ID'].tolist()
+    mask = (se_lat <= lat) & (nw_lat >= lat) & (nw_lon <= lon) & (ne_lon >= lon)
+
+    if mask.any():
+        tiles_to_download[city] = tile_ids[mask].tolist()
     else:
         print(f"⚠️ No tiles found for {city} at coordinates ({lat}, {lon})")
         tiles_to_download[city] = []
@@ -16,11 +16,22 @@ python tsunami_baseline_pipeline.py --mode historical --country Japan --top_n 30
 import pandas as pd
 import numpy as np
 import argparse
+import csv
+import json
 import os
 import math
+import weakref
+import matplotlib
+# Outputs are only ever saved to PNG, so skip the interactive backend
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import folium
-from folium.plugins import MarkerCluster
+from folium.plugins import FastMarkerCluster, MarkerCluster
+
+try:
+    from numba import njit, prange
+except ImportError:  # optional: distance scans fall back to NumPy
+    njit = None
 
 # ---------- Config / defaults ----------
 DEFAULT_INPUT = "world_tsunamis.csv"
@@ -32,67 +43,169 @@ DEFAULT_WEIGHTS = {
     "deposits": 0.2
 }
 
+# Columns read by load_data: the scoring features plus the id/coordinate columns looked up later
+FLOAT_COLUMNS = ("Earthquake Magnitude", "Maximum Water Height (m)", "Number of Runups", "Deposits",
+                 "Latitude", "Lat", "latitude", "LAT", "Longitude", "Lon", "longitude", "LON")
+LOAD_COLUMNS = FLOAT_COLUMNS + ("Country", "Location Name", "Location", "Place", "Name", "Year")
+
 # ---------- Utility functions ----------
+# id(df) -> (weakref to df, df.index, {key: value}) for data derived from a frame's rows
+# (name index, geo arrays, ...). Kept out of df.attrs, which pandas deep-copies into every
+# frame derived from df.
+_FRAME_CACHE = {}
+
+def _frame_cache(df):
+    """Cache dict for df; reset when the frame's index (its rows) is replaced."""
+    key = id(df)
+    entry = _FRAME_CACHE.get(key)
+    if entry is None or entry[0]() is not df or entry[1] is not df.index:
+        entry = (weakref.ref(df, lambda _, key=key: _FRAME_CACHE.pop(key, None)), df.index, {})
+        _FRAME_CACHE[key] = entry
+    return entry[2]
+
+def _read_csv(path, usecols, dtype):
+    try:
+        # pyarrow's multithreaded parser is much faster than the default C engine
+        df = pd.read_csv(path, engine="pyarrow", usecols=usecols, dtype=dtype)
+        # pyarrow keeps duplicate headers as-is; rename them like the C engine does ("col.1")
+        seen = {}
+        cols = []
+        for c in df.columns:
+            n = seen.get(c, 0)
+            cols.append(c if n == 0 else f"{c}.{n}")
+            seen[c] = n + 1
+        df.columns = cols
+    except ImportError:
+        df = pd.read_csv(path, usecols=usecols, dtype=dtype, low_memory=False)
+    return df
+
 def load_data(path=DEFAULT_INPUT):
     print("Loading data...")
     if not os.path.exists(path):
         raise FileNotFoundError(f"CSV not found: {path}")
-    df = pd.read_csv(path)
+    # only parse the columns the pipeline touches (falls back to everything for unfamiliar CSVs)
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = [c for c in header if c in LOAD_COLUMNS] or None
+    dtype = {c: "float64" for c in (usecols or ()) if c in FLOAT_COLUMNS}
+    if usecols and "Country" in usecols:
+        # few distinct countries: store as category so filters scan int codes, not strings
+        dtype["Country"] = "category"
+
+    # parsed copy kept next to the CSV; reused while it is newer and has the expected columns
+    cache = path + ".parquet"
+    df = None
+    if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(path):
+        try:
+            df = pd.read_parquet(cache)
+            if usecols is not None and list(df.columns) != usecols:
+                df = None
+        except (ImportError, OSError, ValueError):
+            df = None
+    if df is None:
+        df = _read_csv(path, usecols, dtype)
+        try:
+            df.to_parquet(cache, compression="zstd")
+        except (ImportError, OSError, ValueError) as e:
+            print(f"Could not write parquet cache {cache}: {e}")
     print("Data loaded. Rows:", len(df))
     return df
 
-def normalize_series(s):
-    if s.max() == s.min():
-        return np.zeros_like(s, dtype=float)
-    return (s - s.min()) / (s.max() - s.min())
+def fit_normalization(df,
+                      cols=("Earthquake Magnitude", "Maximum Water Height (m)", "Number of Runups", "Deposits")):
+    """
+    Compute per-column (min, max) normalization bounds from a baseline dataset.
+    Pass the result as `norms` to compute_damage_score to score new rows on the same scale
+    without appending them to (and rescoring) the whole dataset.
+    """
+    cols = list(cols)
+    X = df[cols].astype(float)
+    return {c: (float(mn), float(mx)) for c, mn, mx in zip(cols, X.min(), X.max())}
 
 def compute_damage_score(df, weights=None,
                          mag_col="Earthquake Magnitude",
                          height_col="Maximum Water Height (m)",
                          runups_col="Number of Runups",
-                         deposits_col="Deposits"):
+                         deposits_col="Deposits",
+                         norms=None,
+                         dtype=np.float64):
+    # dtype=np.float32 halves the memory traffic of the scoring pass on large inputs;
+    # scores then agree with float64 to ~7 significant digits
     if weights is None:
         weights = DEFAULT_WEIGHTS
 
-    for col in [mag_col, height_col, runups_col, deposits_col]:
+    feature_cols = [mag_col, height_col, runups_col, deposits_col]
+    for col in feature_cols:
         if col not in df.columns:
             raise KeyError(f"Missing required column in data: {col}")
 
-    df = df.copy()
-    df["_mag_n"] = normalize_series(df[mag_col].astype(float))
-    df["_h_n"] = normalize_series(df[height_col].astype(float))
-    df["_r_n"] = normalize_series(df[runups_col].astype(float))
-    df["_d_n"] = normalize_series(df[deposits_col].astype(float))
-
-    score = (
-        weights.get("magnitude", 0.0) * df["_mag_n"] +
-        weights.get("max_height", 0.0) * df["_h_n"] +
-        weights.get("runups", 0.0) * df["_r_n"] +
-        weights.get("deposits", 0.0) * df["_d_n"]
-    )
-    score = np.clip(score, 0.0, 1.0)
-    df["Damage Score"] = score
-    # remove aux cols
-    df = df.drop(columns=["_mag_n","_h_n","_r_n","_d_n"], errors='ignore')
+    # Normalize all four features and take the weighted sum in one pass over an (n, 4) array,
+    # instead of materializing (and then dropping) a scratch column per feature
+    X = df[feature_cols].to_numpy(dtype=dtype)
+    bounds = fit_normalization(df, feature_cols) if norms is None else norms
+    mins = np.array([bounds[c][0] for c in feature_cols], dtype=dtype)
+    maxs = np.array([bounds[c][1] for c in feature_cols], dtype=dtype)
+    # against fixed bounds the normalized values are clipped to [0, 1], so a value outside the
+    # baseline range scores exactly as if it had been appended to the baseline data
+    X_n = _normalize_features(X, mins, maxs, clip=norms is not None)
+
+    score = np.clip(_weighted_sum(X_n, _weight_vector(weights).astype(dtype, copy=False)), 0.0, 1.0)
+    df = df.assign(**{"Damage Score": score})
+    # Keep the normalization baseline so single scenarios can be scored later via score_single.
+    # Plain float tuples: attrs are copied into every derived frame and compared by pd.concat
+    df.attrs["_norm_stats"] = (tuple(map(float, mins)), tuple(map(float, maxs)), tuple(feature_cols))
     return df
 
+def _weight_vector(weights):
+    return np.array([
+        weights.get("magnitude", 0.0),
+        weights.get("max_height", 0.0),
+        weights.get("runups", 0.0),
+        weights.get("deposits", 0.0),
+    ], dtype=float)
+
+def _weighted_sum(X_n, w):
+    # w . X_n over the last axis, summed feature by feature in order; a matmul would round
+    # differently and shift scores in the last digit
+    score = w[0] * X_n[..., 0]
+    for j in range(1, len(w)):
+        score = score + w[j] * X_n[..., j]
+    return score
+
+def _normalize_features(X, mins, maxs, clip=False):
+    # min-max normalize the last axis of X; constant features normalize to 0
+    span = maxs - mins
+    X_n = (X - mins) / np.where(span > 0, span, 1.0)
+    if clip:
+        np.clip(X_n, 0.0, 1.0, out=X_n)
+    X_n[..., ~(span > 0)] = 0.0
+    return X_n
+
+def score_single(raw_vals, weights, stats):
+    """
+    Score one scenario [magnitude, max_height, runups, deposits] against the normalization
+    stats of an already-scored dataset (df_scores.attrs["_norm_stats"]).
+    Gives the same score as appending the row to the dataset and rescoring it, in O(1).
+    """
+    mins, maxs = np.asarray(stats[0], dtype=float), np.asarray(stats[1], dtype=float)
+    x_n = _normalize_features(np.asarray(raw_vals, dtype=float), mins, maxs, clip=True)
+    return float(np.clip(_weighted_sum(x_n, _weight_vector(weights)), 0.0, 1.0))
+
 def scenario_from_user_inputs(magnitude, max_height, runups, deposits, df_template):
     """
-    Build a one-row DataFrame representing a synthetic scenario.
-    Use df_template only to keep same columns and to compute normalization baseline.
+    Append a synthetic scenario to the dataset's four feature columns.
+    Returns (X, i): an (n+1, 4) float array whose last row i is the scenario, ordered as
+    magnitude, max height, runups, deposits. To just score the scenario, prefer score_single
+    with the dataset's cached normalization stats.
     """
-    row = {}
     mag_col = "Earthquake Magnitude"
     height_col = "Maximum Water Height (m)"
     runups_col = "Number of Runups"
     deposits_col = "Deposits"
 
-    # prepare a df with this new scenario appended to the dataset so normalization is consistent
-    newrow = {mag_col: magnitude, height_col: max_height, runups_col: runups, deposits_col: deposits}
-    df_temp = df_template[[mag_col, height_col, runups_col, deposits_col]].copy()
-    newrow_df = pd.DataFrame([newrow])
-    df_temp = pd.concat([df_temp, newrow_df], ignore_index=True)
-    return df_temp, len(df_temp) - 1 
+    # stack the new row under the raw feature array instead of concatenating DataFrames
+    X = df_template[[mag_col, height_col, runups_col, deposits_col]].to_numpy(dtype=float)
+    X = np.vstack([X, [magnitude, max_height, runups, deposits]])
+    return X, len(X) - 1
 
 def estimate_loss_from_score(score, total_exposed_value_usd, calibration_factor=0.159469):
     """
@@ -138,20 +251,21 @@ def compute_adjusted_weights_from_example(x_vec, w0, target_score, enforce_nonne
     x = np.asarray(x_vec, dtype=float).reshape(4)
     w0 = np.asarray(w0, dtype=float).reshape(4)
 
-    # Build A and b such that A @ w = b. A shape (2,4): [x; ones]
-    A = np.vstack([x, np.ones_like(x)])
-    b = np.array([float(target_score), 1.0])
-
-    # Compute projection: w = w0 - A^T (A A^T)^{-1} (A w0 - b)
-    ATA = A @ A.T  # 2x2
-    try:
-        inv_ATA = np.linalg.inv(ATA)
-    except np.linalg.LinAlgError:
+    # Projection: w = w0 - A^T (A A^T)^{-1} (A w0 - b), with A = [x; ones] (2x4) and
+    # b = [target_score, 1]. A A^T is [[x.x, sum(x)], [sum(x), 4]], inverted in closed form.
+    sx = x.sum()
+    xx = x @ x
+    det = 4.0 * xx - sx * sx
+    if abs(det) < 1e-12:
         # Degenerate (e.g., x and ones are linearly dependent) -> fall back to returning w0
         return w0
 
-    correction = A.T @ (inv_ATA @ (A @ w0 - b))
-    w = w0 - correction
+    r0 = x @ w0 - float(target_score)
+    r1 = w0.sum() - 1.0
+    y0 = (4.0 * r0 - sx * r1) / det
+    y1 = (xx * r1 - sx * r0) / det
+    # A^T @ [y0, y1]
+    w = w0 - (x * y0 + y1)
 
     if enforce_nonneg:
         w = np.clip(w, 0.0, None)
@@ -168,15 +282,36 @@ def save_summary_csv(df, path):
     df.to_csv(path, index=False)
     print(f"Saved CSV: {path}")
 
+def _write_one_row_csv(path, row):
+    # a header plus one row doesn't need a DataFrame; same layout as DataFrame.to_csv(index=False)
+    with open(path, "w", newline="") as fh:
+        w = csv.writer(fh, lineterminator="\n")
+        w.writerow(row.keys())
+        w.writerow(row.values())
+
+def _top_k_indices(scores, k):
+    """Positions of the k largest scores, highest first (NaN last), in O(N + k log k)."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    neg = -np.asarray(scores, dtype=float)
+    idx = np.argpartition(neg, k - 1)[:k]
+    return idx[np.argsort(neg[idx], kind="stable")]
+
+def _top_by_score(df, k):
+    # equivalent to df.sort_values("Damage Score", ascending=False).head(k) without a full sort
+    return df.iloc[_top_k_indices(df["Damage Score"].to_numpy(dtype=float), k)]
+
 # ---------- Reporting helpers ----------
 def plot_histogram_scores(df, out_png):
+    counts, edges = np.histogram(df["Damage Score"].dropna().to_numpy(dtype=float), bins=25)
     plt.figure(figsize=(6,4))
-    plt.hist(df["Damage Score"].dropna(), bins=25, edgecolor="k")
+    plt.bar(edges[:-1], counts, width=np.diff(edges), align="edge", edgecolor="k")
     plt.title("Distribution of Damage Scores")
     plt.xlabel("Damage Score")
     plt.ylabel("Count")
     plt.tight_layout()
-    plt.savefig(out_png, dpi=150)
+    plt.savefig(out_png, dpi=100)
     plt.close()
     print(f"Saved plot: {out_png}")
 
@@ -197,19 +332,27 @@ def plot_top_locations(df, out_png, top_n=50):
         return
 
     sub = df.dropna(subset=[lat_col, lon_col, "Damage Score"]).copy()
-    sub = sub.sort_values("Damage Score", ascending=False).head(top_n)
+    sub = _top_by_score(sub, top_n)
     plt.figure(figsize=(6,4))
-    plt.scatter(sub[lon_col], sub[lat_col], c=sub["Damage Score"], cmap="Reds", s=40)
+    plt.scatter(sub[lon_col], sub[lat_col], c=sub["Damage Score"], cmap="Reds", s=40, rasterized=True)
     plt.colorbar(label="Damage Score")
     plt.title(f"Top {top_n} vulnerable locations (by Damage Score)")
     plt.xlabel("Longitude")
     plt.ylabel("Latitude")
     plt.tight_layout()
-    plt.savefig(out_png, dpi=150)
+    plt.savefig(out_png, dpi=100)
     plt.close()
     print(f"Saved scatter plot: {out_png}")
 
-def create_folium_map(df, out_html, top_k=200):
+# FastMarkerCluster callback for rows of [lat, lon, radius, popup html]
+_FAST_MARKER_CALLBACK = """function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+                                {radius: row[2], stroke: false, fill: true, fillOpacity: 0.7});
+    marker.bindPopup(row[3], {maxWidth: 300});
+    return marker;
+}"""
+
+def create_folium_map(df, out_html, top_k=200, rich_popups=False):
     # Create a map centered at median location
     lat_col = None
     lon_col = None
@@ -233,22 +376,31 @@ def create_folium_map(df, out_html, top_k=200):
     cen_lat = float(dfp[lat_col].median())
     cen_lon = float(dfp[lon_col].median())
     fmap = folium.Map(location=[cen_lat, cen_lon], zoom_start=5, tiles="CartoDB positron")
-    mc = MarkerCluster()
     # add top_k points by score
-    dfp = dfp.sort_values("Damage Score", ascending=False).head(top_k)
-    for _, r in dfp.iterrows():
-        lat = float(r[lat_col])
-        lon = float(r[lon_col])
-        score = float(r["Damage Score"])
-        txt = f"{r.get('Location Name','')}<br>Score: {score:.3f}"
-        folium.CircleMarker(
-            location=[lat, lon],
-            radius=4 + score*6,
-            color=None,
-            fill=True,
-            fill_opacity=0.7,
-            popup=folium.Popup(txt, max_width=300)
-        ).add_to(mc)
+    dfp = _top_by_score(dfp, top_k)
+    # pull the columns out once instead of boxing every row into a Series
+    lats = dfp[lat_col].to_numpy(dtype=float).tolist()
+    lons = dfp[lon_col].to_numpy(dtype=float).tolist()
+    scores = dfp["Damage Score"].to_numpy(dtype=float)
+    radii = (4 + scores * 6).tolist()
+    names = dfp["Location Name"].tolist() if "Location Name" in dfp.columns else [""] * len(dfp)
+    popups = [f"{name}<br>Score: {score:.3f}" for name, score in zip(names, scores.tolist())]
+    if rich_popups:
+        # one Python-side marker object per point
+        mc = MarkerCluster()
+        for lat, lon, radius, txt in zip(lats, lons, radii, popups):
+            mc.add_child(folium.CircleMarker(
+                location=[lat, lon],
+                radius=radius,
+                color=None,
+                fill=True,
+                fill_opacity=0.7,
+                popup=folium.Popup(txt, max_width=300)
+            ))
+    else:
+        # ship the points as one array and build the markers in the browser
+        mc = FastMarkerCluster([list(row) for row in zip(lats, lons, radii, popups)],
+                               callback=_FAST_MARKER_CALLBACK)
     fmap.add_child(mc)
     fmap.save(out_html)
     print(f"Saved folium map: {out_html}")
@@ -268,36 +420,142 @@ def _find_lat_lon_cols(df):
             break
     return lat_col, lon_col
 
-def _haversine_km(lat1, lon1, lat2, lon2):
+def _precompute_geo(df, lat_col, lon_col):
+    """
+    Radians / cos(lat) of the rows with coordinates, cached per frame so repeated distance
+    scans over the same frame skip the dataset-side trig. "pos" holds the row positions.
+    """
+    cache = _frame_cache(df)
+    geo = cache.get(("geo", lat_col, lon_col))
+    if geo is None:
+        # float64 columns (as load_data pins them) come back as views, not copies
+        lat = df[lat_col].to_numpy(dtype=np.float64, copy=False)
+        lon = df[lon_col].to_numpy(dtype=np.float64, copy=False)
+        valid = ~(np.isnan(lat) | np.isnan(lon))
+        pos = np.flatnonzero(valid)
+        if pos.size < lat.size:
+            lat, lon = lat[pos], lon[pos]
+        lat_rad = np.radians(lat)
+        geo = {
+            "pos": pos,
+            "lat_rad": lat_rad,
+            "cos_lat": np.cos(lat_rad),
+            "lon_rad": np.radians(lon),
+        }
+        cache[("geo", lat_col, lon_col)] = geo
+    return geo
+
+# Scans at least this long go through the fused numba kernel when numba is installed
+HAVERSINE_JIT_MIN = 1024
+
+if njit is not None:
+    # fastmath without "nnan"/"ninf": raw coordinates may still contain NaN
+    @njit(parallel=True, fastmath={"contract", "afn", "reassoc"}, cache=True)
+    def _haversine_km_jit(lat1r, lon1r, cos_lat1, lat2_rad, cos_lat2, lon2_rad, out):
+        # one pass per point, no N-sized temporaries
+        for i in prange(lat2_rad.shape[0]):
+            s_lat = math.sin((lat2_rad[i] - lat1r) * 0.5)
+            s_lon = math.sin((lon2_rad[i] - lon1r) * 0.5)
+            a = s_lat * s_lat + cos_lat1 * cos_lat2[i] * s_lon * s_lon
+            out[i] = 6371.0 * 2.0 * math.atan2(math.sqrt(a), math.sqrt(1.0 - a))
+        return out
+else:
+    _haversine_km_jit = None
+
+def _haversine_km(lat1, lon1, lat2=None, lon2=None, lat2_rad=None, cos_lat2=None, lon2_rad=None):
     # vectorized haversine: inputs in degrees, returns km
-    lat1r = np.radians(lat1)
-    lon1r = np.radians(lon1)
-    lat2r = np.radians(lat2)
-    lon2r = np.radians(lon2)
-    dlat = lat2r - lat1r
-    dlon = lon2r - lon1r
-    a = np.sin(dlat/2.0)**2 + np.cos(lat1r) * np.cos(lat2r) * np.sin(dlon/2.0)**2
+    # the second point may instead be given as precomputed radians/cos (see _precompute_geo)
+    # contiguous float64 inputs keep the trig ufuncs on their vectorized loops
+    lat1r = np.radians(np.asarray(lat1, dtype=np.float64))
+    lon1r = np.radians(np.asarray(lon1, dtype=np.float64))
+    if lat2_rad is None:
+        lat2_rad = np.radians(np.ascontiguousarray(lat2, dtype=np.float64))
+    if cos_lat2 is None:
+        cos_lat2 = np.cos(lat2_rad)
+    if lon2_rad is None:
+        lon2_rad = np.radians(np.ascontiguousarray(lon2, dtype=np.float64))
+    # one query point against a long 1-D batch: use the fused kernel
+    if (_haversine_km_jit is not None and lat1r.ndim == 0 and lon1r.ndim == 0
+            and np.ndim(lat2_rad) == 1 and np.size(lat2_rad) >= HAVERSINE_JIT_MIN
+            and np.shape(cos_lat2) == np.shape(lat2_rad) == np.shape(lon2_rad)):
+        lat2_rad = np.ascontiguousarray(lat2_rad, dtype=np.float64)
+        return _haversine_km_jit(float(lat1r), float(lon1r), math.cos(lat1r), lat2_rad,
+                                 np.ascontiguousarray(cos_lat2, dtype=np.float64),
+                                 np.ascontiguousarray(lon2_rad, dtype=np.float64),
+                                 np.empty_like(lat2_rad))
+    dlat = lat2_rad - lat1r
+    dlon = lon2_rad - lon1r
+    a = np.sin(dlat/2.0)**2 + np.cos(lat1r) * cos_lat2 * np.sin(dlon/2.0)**2
     c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
     return 6371.0 * c
 
+def _haversine_to_geo(lat, lon, geo):
+    return _haversine_km(lat, lon, lat2_rad=geo["lat_rad"], cos_lat2=geo["cos_lat"], lon2_rad=geo["lon_rad"])
+
+def _within_radius(lat, lon, geo, radius_km):
+    """
+    Positions (into the geo arrays) and distances of the points within radius_km of (lat, lon).
+    A lat/lon bounding box around the circle is checked first so only its survivors get haversine.
+    """
+    ang = radius_km / 6371.0 + 1e-9
+    lat_r = math.radians(lat)
+    box = np.abs(geo["lat_rad"] - lat_r) <= ang
+    # the circle's longitude half-width; skip the check when it reaches a pole
+    if abs(lat_r) + ang < math.pi / 2:
+        dlon_max = math.asin(math.sin(ang) / math.cos(lat_r))
+        dlon = np.abs((geo["lon_rad"] - math.radians(lon) + math.pi) % (2 * math.pi) - math.pi)
+        box &= dlon <= dlon_max
+    cand = np.flatnonzero(box)
+    dists = _haversine_km(lat, lon, lat2_rad=geo["lat_rad"][cand], cos_lat2=geo["cos_lat"][cand],
+                          lon2_rad=geo["lon_rad"][cand])
+    keep = dists <= radius_km
+    return cand[keep], dists[keep]
+
 def find_nearest_location(df, lat, lon):
     lat_col, lon_col = _find_lat_lon_cols(df)
     if lat_col is None or lon_col is None:
         return None, None
-    dfp = df.dropna(subset=[lat_col, lon_col]).copy()
-    if dfp.empty:
+    geo = _precompute_geo(df, lat_col, lon_col)
+    if geo["pos"].size == 0:
         return None, None
-    dists = _haversine_km(lat, lon, dfp[lat_col].astype(float).values, dfp[lon_col].astype(float).values)
+    dists = _haversine_to_geo(lat, lon, geo)
     imin = int(np.argmin(dists))
-    idx = dfp.index[imin]
+    idx = df.index[geo["pos"][imin]]
     return idx, float(dists[imin])
 
+def _build_name_index(df):
+    """
+    Lowercased values plus an exact-match {value: position} dict for each location-name
+    column, cached per frame so repeated lookups skip re-stringifying.
+    """
+    cache = _frame_cache(df)
+    idx = cache.get("name_index")
+    if idx is None:
+        name_cols = [c for c in df.columns if c.lower() in ("location name","location","place","name")] or [c for c in df.columns if 'location' in c.lower()]
+        cols = {}
+        for col in name_cols:
+            vals = df[col].astype(str).fillna("").str.lower().tolist()
+            exact = {}
+            for i, v in enumerate(vals):
+                exact.setdefault(v, i)
+            cols[col] = (vals, exact)
+        idx = {"cols": cols}
+        cache["name_index"] = idx
+    return idx
+
 def find_location_by_name(df, name):
     # search common location-name columns and (optionally) use fuzzy matching
-    name_cols = [c for c in df.columns if c.lower() in ("location name","location","place","name")] or [c for c in df.columns if 'location' in c.lower()]
     raw_name = (name or '').strip()
-    if not name_cols or not raw_name:
+    cols = _build_name_index(df)["cols"] if raw_name else {}
+    if not cols:
         return None, None
+    lower = raw_name.lower()
+
+    # exact (case-insensitive) hits are a dict lookup
+    for vals, exact in cols.values():
+        i = exact.get(lower)
+        if i is not None:
+            return df.index[i], 100.0
 
     # try to use rapidfuzz for fuzzy search; fall back to substring match
     try:
@@ -309,35 +567,31 @@ def find_location_by_name(df, name):
     # iterate candidate columns
     best_idx = None
     best_score = -1.0
-    for col in name_cols:
-        col_vals = df[col].astype(str).fillna("").tolist()
+    for vals, _ in cols.values():
         if use_rapid:
-            # rapidfuzz returns tuples (match, score, index)
-            try:
-                matches = process.extract(raw_name, col_vals, scorer=fuzz.WRatio, limit=3)
-                if matches:
-                    m_match, m_score, m_i = matches[0]
-                    if m_score > best_score:
-                        best_score = float(m_score)
-                        best_idx = df.index[int(m_i)]
-            except Exception:
-                pass
+            # rapidfuzz returns (match, score, index), or None below the cutoff
+            match = process.extractOne(lower, vals, scorer=fuzz.WRatio, score_cutoff=60)
+            if match and match[1] > best_score:
+                best_score = float(match[1])
+                best_idx = df.index[match[2]]
         else:
             # simple substring search (case-insensitive)
-            lower = raw_name.lower()
-            for i, v in enumerate(col_vals):
-                if lower in v.lower():
-                    # assign a high confidence for substring
-                    best_idx = df.index[i]
-                    best_score = 100.0
-                    break
-            if best_score == 100.0:
-                break
+            i = next((i for i, v in enumerate(vals) if lower in v), None)
+            if i is not None:
+                # assign a high confidence for substring
+                return df.index[i], 100.0
 
     if best_idx is None:
         return None, None
     return best_idx, best_score
 
+def _sorted_scores(df):
+    # sorted non-NaN Damage Scores, cached per frame so percentile lookups are a binary search
+    cache = _frame_cache(df)
+    if "sorted_scores" not in cache:
+        cache["sorted_scores"] = np.sort(df["Damage Score"].dropna().to_numpy(dtype=float))
+    return cache["sorted_scores"]
+
 def generate_location_report(args, df_scores, weights):
     """Given args with either lat/lon or location_name, produce a human-readable report and CSVs."""
     lat_col, lon_col = _find_lat_lon_cols(df_scores)
@@ -348,25 +602,17 @@ def generate_location_report(args, df_scores, weights):
         target_idx, match_score = find_location_by_name(df_scores, args.location_name)
         if target_idx is None and args.verbose:
             print(f"No name match for '{args.location_name}'")
+    # If not found by name, fall back to nearest by provided coords (if any), else None
     if target_idx is None and args.lat is not None and args.lon is not None:
         target_idx, distance_km = find_nearest_location(df_scores, args.lat, args.lon)
 
-    # If still not found, fall back to nearest by provided coords (if any), else None
-    if target_idx is None and args.lat is not None and args.lon is not None:
-        target_idx, distance_km = find_nearest_location(df_scores, args.lat, args.lon)
-
-    # Prepare the template for normalization (use the full dataset so scores are comparable)
-    df_template = df_scores
-
-    # Create the synthetic scenario and append
-    df_temp, idx_in_temp = scenario_from_user_inputs(args.magnitude, args.max_height, args.runups, args.deposits, df_template)
-    df_temp_scored = compute_damage_score(df_temp, weights=weights)
-    scenario_row = df_temp_scored.iloc[idx_in_temp]
-    score = float(scenario_row["Damage Score"])
+    # Score the synthetic scenario against the full dataset's normalization so scores are comparable
+    score = score_single([args.magnitude, args.max_height, args.runups, args.deposits],
+                         weights, df_scores.attrs["_norm_stats"])
 
     # Compute percentile relative to original dataset (exclude any NaNs)
-    base_scores = df_scores["Damage Score"].dropna().astype(float)
-    percentile = 100.0 * (base_scores < score).sum() / max(1, len(base_scores))
+    sorted_scores = _sorted_scores(df_scores)
+    percentile = 100.0 * np.searchsorted(sorted_scores, score, side="left") / max(1, len(sorted_scores))
 
     est_loss = estimate_loss_from_score(score, args.total_exposed_value_usd, args.calibration_factor)
 
@@ -383,11 +629,11 @@ def generate_location_report(args, df_scores, weights):
             ref_lat = ref_lon = None
 
         if ref_lat is not None:
-            dfp = df_scores.dropna(subset=[lat_col, lon_col]).copy()
-            dists = _haversine_km(ref_lat, ref_lon, dfp[lat_col].astype(float).values, dfp[lon_col].astype(float).values)
-            dfp = dfp.assign(_dist_km=dists)
-            nearby = dfp[dfp._dist_km <= args.nearby_km].sort_values("Damage Score", ascending=False).head(10)
-            nearby_summary = nearby[[lat_col, lon_col, "Damage Score"]].copy()
+            geo = _precompute_geo(df_scores, lat_col, lon_col)
+            cand, dists = _within_radius(ref_lat, ref_lon, geo, args.nearby_km)
+            dfp = df_scores.iloc[geo["pos"][cand]].assign(_dist_km=dists)
+            nearby = _top_by_score(dfp, 10)
+            nearby_summary = nearby[[lat_col, lon_col, "Damage Score"]]
 
     # Build human-readable output
     lines = []
@@ -438,7 +684,7 @@ def generate_location_report(args, df_scores, weights):
         "Percentile": percentile,
         "Estimated Loss USD": est_loss
     }
-    pd.DataFrame([summary_row]).to_csv(out_csv, index=False)
+    _write_one_row_csv(out_csv, summary_row)
     print(f"Saved location report summary: {out_csv}")
     if nearby_summary is not None and not nearby_summary.empty:
         nearby_csv = f"{args.out_prefix}_nearby_events.csv"
@@ -457,14 +703,20 @@ def run_pipeline(args):
         "runups": args.w_runups,
         "deposits": args.w_deposits
     }
-    df_scores = compute_damage_score(df, weights=weights)
+    df_scores = compute_damage_score(df, weights=weights,
+                                     dtype=np.float32 if args.float32 else np.float64)
 
     out_prefix = args.out_prefix or "tsunami_baseline"
+    result = {"df_scores": df_scores, "weights": weights, "scenario_score": None, "x_vec": None,
+              "norm_stats": df_scores.attrs["_norm_stats"]}
 
     if args.mode == "historical":
         # Filter by country if requested
         if args.country:
-            df_hist = df_scores[df_scores["Country"].str.lower().str.contains(args.country.lower(), na=False)].copy()
+            country = df_scores["Country"].astype("category")
+            # match the query against the (few) distinct countries, then select rows by category code
+            hits = np.flatnonzero(country.cat.categories.str.contains(args.country, case=False, regex=False))
+            df_hist = df_scores[np.isin(country.cat.codes.to_numpy(), hits)].copy()
             if df_hist.empty:
                 print(f"No historical records found for country matching '{args.country}'. Using full dataset instead.")
                 df_hist = df_scores.copy()
@@ -473,10 +725,11 @@ def run_pipeline(args):
 
         # Aggregate top N events / locations by Damage Score
         top_n = args.top_n
-        df_top = df_hist.sort_values("Damage Score", ascending=False).head(top_n)
-        # Compute estimated losses per row
-        df_top["Estimated Loss USD"] = df_top["Damage Score"].apply(
-            lambda s: estimate_loss_from_score(s, args.total_exposed_value_usd, args.calibration_factor)
+        df_top = _top_by_score(df_hist, top_n)
+        # Compute estimated losses per row (same mapping as estimate_loss_from_score, vectorized)
+        df_top["Estimated Loss USD"] = (
+            df_top["Damage Score"].to_numpy(dtype=float)
+            * float(args.total_exposed_value_usd) * float(args.calibration_factor)
         )
 
         # Save top list
@@ -486,7 +739,7 @@ def run_pipeline(args):
         # plots and map
         plot_histogram_scores(df_hist, f"{out_prefix}_hist_scores_hist.png")
         plot_top_locations(df_hist, f"{out_prefix}_top_locations_scatter.png", top_n=min(200, top_n))
-        create_folium_map(df_hist, f"{out_prefix}_map_top{top_n}.html", top_k=min(400, top_n))
+        create_folium_map(df_hist, f"{out_prefix}_map_top{top_n}.html", top_k=min(400, top_n), rich_popups=args.rich_popups)
 
         # summary print
         total_est = df_top["Estimated Loss USD"].sum()
@@ -496,18 +749,18 @@ def run_pipeline(args):
         print(f"Saved outputs with prefix: {out_prefix}_*")
 
     elif args.mode == "synthetic":
+        # Normalized feature vector and score of the synthetic scenario (reused for calibration)
+        mins, maxs, _ = result["norm_stats"]
+        raw = [args.magnitude, args.max_height, args.runups, args.deposits]
+        result["x_vec"] = _normalize_features(np.asarray(raw, dtype=float),
+                                              np.asarray(mins, dtype=float), np.asarray(maxs, dtype=float))
+        result["scenario_score"] = score_single(raw, weights, result["norm_stats"])
+
         # If a location is requested, generate a location-focused report
         if args.location_name or (args.lat is not None and args.lon is not None):
             generate_location_report(args, df_scores, weights)
         else:
-            # Build synthetic scenario
-            df_template = df_scores
-            df_temp, idx = scenario_from_user_inputs(args.magnitude, args.max_height, args.runups, args.deposits, df_template)
-            # Compute scores on extended table
-            df_temp_scored = compute_damage_score(df_temp, weights=weights)
-            # Our synthetic scenario is the last row
-            scenario_row = df_temp_scored.iloc[idx]
-            score = float(scenario_row["Damage Score"])
+            score = result["scenario_score"]
             est_loss = estimate_loss_from_score(score, args.total_exposed_value_usd, args.calibration_factor)
 
             # Create a small report CSV
@@ -522,7 +775,7 @@ def run_pipeline(args):
                 "Total Exposed USD (input)": args.total_exposed_value_usd,
                 "Calibration Factor": args.calibration_factor
             }
-            pd.DataFrame([row_out]).to_csv(out_csv, index=False)
+            _write_one_row_csv(out_csv, row_out)
             print(f"Synthetic scenario saved to {out_csv}")
             # simple printout
             print("\nSYNTHETIC SCENARIO SUMMARY")
@@ -539,13 +792,15 @@ def run_pipeline(args):
             plot_histogram_scores(df_scores, f"{out_prefix}_all_scores_hist.png")
             # Save a tiny map with dataset + scenario point if lat/lon provided or default to center
             try:
-                create_folium_map(df_scores, f"{out_prefix}_all_map.html", top_k=200)
+                create_folium_map(df_scores, f"{out_prefix}_all_map.html", top_k=200, rich_popups=args.rich_popups)
             except Exception as e:
                 print("Map creation issue:", e)
 
     else:
         raise ValueError("Unknown mode. Choose 'historical' or 'synthetic'")
 
+    return result
+
 # ---------- CLI ----------
 def parse_args():
     p = argparse.ArgumentParser(description="Tsunami formula-only baseline pipeline")
@@ -580,6 +835,10 @@ def parse_args():
     p.add_argument("--calibrate_weights_from_actual", action='store_true',
                    help="If set along with --calibrate_actual_loss in synthetic mode, adjust feature weights so the synthetic scenario's normalized feature blend matches the implied score from the actual loss. Saves adjusted weights to <out_prefix>_weights.json.")
 
+    p.add_argument("--rich_popups", action="store_true",
+                   help="Build folium markers in Python instead of the faster in-browser cluster")
+    p.add_argument("--float32", action="store_true",
+                   help="Score in float32 (less memory; scores match float64 to ~7 digits)")
     p.add_argument("--out_prefix", default="tsunami_baseline", help="Prefix for saved outputs")
     p.add_argument("--verbose", action="store_true", help="Enable verbose printing")
     return p.parse_args()
@@ -587,25 +846,10 @@ def parse_args():
 if __name__ == "__main__":
     args = parse_args()
     # If user asked for calibration, perform compute after running synthetic scoring
-    run_pipeline(args)
+    result = run_pipeline(args)
     if args.calibrate_actual_loss is not None and args.mode == 'synthetic':
-        # Recompute score for the exact synthetic scenario using full dataset template
-        df = load_data(args.input_csv)
-        df_scores = compute_damage_score(df, weights={
-            "magnitude": args.w_magnitude,
-            "max_height": args.w_max_height,
-            "runups": args.w_runups,
-            "deposits": args.w_deposits
-        })
-        df_temp, idx = scenario_from_user_inputs(args.magnitude, args.max_height, args.runups, args.deposits, df_scores)
-        df_temp_scored = compute_damage_score(df_temp, weights={
-            "magnitude": args.w_magnitude,
-            "max_height": args.w_max_height,
-            "runups": args.w_runups,
-            "deposits": args.w_deposits
-        })
-        scenario_row = df_temp_scored.iloc[idx]
-        score = float(scenario_row["Damage Score"])
+        # Reuse the synthetic scenario score computed against the full dataset in run_pipeline
+        score = result["scenario_score"]
         actual_loss = float(args.calibrate_actual_loss)
         calib = compute_calibration_factor_from_loss(score, actual_loss, args.total_exposed_value_usd)
         if calib is None:
@@ -619,49 +863,16 @@ if __name__ == "__main__":
             print(f"Saved calibration factor to {outf}")
             # Optionally adjust weights to match the implied score
             if args.calibrate_weights_from_actual:
-                # Build normalized feature vector for the synthetic example (we used df_temp_scored)
-                # Need the normalized features before scoring: recompute normalized series on full dataset
-                df_base = df_scores
-                mag_col = "Earthquake Magnitude"
-                height_col = "Maximum Water Height (m)"
-                runups_col = "Number of Runups"
-                deposits_col = "Deposits"
-                # compute normalized series on df_base
-                x_mag = normalize_series(df_base[mag_col].astype(float))
-                x_h = normalize_series(df_base[height_col].astype(float))
-                x_r = normalize_series(df_base[runups_col].astype(float))
-                x_d = normalize_series(df_base[deposits_col].astype(float))
-                # The synthetic point values used earlier are the last row of df_temp (idx)
-                # Recreate the same temp and pick the raw feature values
-                df_temp_raw, idx_temp = scenario_from_user_inputs(args.magnitude, args.max_height, args.runups, args.deposits, df_base)
-                raw = df_temp_raw.iloc[idx_temp]
-                # Normalize the raw values using the same min/max as df_base
-                def norm_val(series, val):
-                    mn = series.min(); mx = series.max()
-                    if mx == mn:
-                        return 0.0
-                    return (val - mn) / (mx - mn)
-
-                x_vec = np.array([
-                    norm_val(df_base[mag_col].astype(float), raw[mag_col]),
-                    norm_val(df_base[height_col].astype(float), raw[height_col]),
-                    norm_val(df_base[runups_col].astype(float), raw[runups_col]),
-                    norm_val(df_base[deposits_col].astype(float), raw[deposits_col])
-                ], dtype=float)
-
-                # current weights
-                w0 = np.array([args.w_magnitude, args.w_max_height, args.w_runups, args.w_deposits], dtype=float)
+                # Normalized feature vector of the synthetic example, using the full dataset's min/max
+                x_vec = result["x_vec"]
+
+                # current weights, as used by run_pipeline
+                w0 = _weight_vector(result["weights"])
                 # implied target score from actual loss
                 implied_score = actual_loss / float(args.total_exposed_value_usd) / float(calib)
                 # compute adjusted weights
                 w_new = compute_adjusted_weights_from_example(x_vec, w0, implied_score, enforce_nonneg=True)
-                import json
                 outf_w = f"{args.out_prefix}_weights.json"
                 with open(outf_w, 'w') as fh:
-                    json.dump({
-                        "magnitude": float(w_new[0]),
-                        "max_height": float(w_new[1]),
-                        "runups": float(w_new[2]),
-                        "deposits": float(w_new[3])
-                    }, fh, indent=2)
+                    json.dump(dict(zip(DEFAULT_WEIGHTS, map(float, w_new))), fh, indent=2)
                 print(f"Saved adjusted weights to {outf_w}")
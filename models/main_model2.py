@@ -3,16 +3,27 @@ import numpy as np
 from sklearn.linear_model import LinearRegression
 import json
 import os
+import weakref
 
 # ==========================================================
 # 1. Data Loading & Preprocessing
 # ==========================================================
 
-def load_data(filepath: str) -> pd.DataFrame:
-    """Load tsunami dataset from a CSV file."""
+def load_data(filepath: str, usecols=None, chunksize: int | None = None):
+    """Load tsunami dataset from a CSV file.
+
+    usecols restricts parsing to the listed columns. With chunksize, an iterator of
+    DataFrames is returned instead, so large files can be scored without loading them whole.
+    """
     if not os.path.exists(filepath):
         raise FileNotFoundError(f"Dataset not found at: {filepath}")
-    df = pd.read_csv(filepath)
+    header = pd.read_csv(filepath, nrows=0).columns
+    dtype = {c: "float64" for c in DAMAGE_WEIGHTS if c in header and (usecols is None or c in usecols)}
+    if chunksize is not None:
+        return pd.read_csv(filepath, usecols=usecols, dtype=dtype, chunksize=chunksize)
+    # pyarrow infers column types per block and rejects this file's late float values in
+    # int-looking columns, so stick with the C engine, typing each column over the whole file
+    df = pd.read_csv(filepath, usecols=usecols, dtype=dtype, low_memory=False)
     return df
 
 
@@ -37,6 +48,10 @@ def validate_inputs(magnitude: float, height: float, runups: float, deposits: fl
 # 2. Core Modeling Functions
 # ==========================================================
 
+# Damage score weights, also used for the analytic sensitivities
+DAMAGE_WEIGHTS = {"Magnitude": 0.4, "Max Water Height (m)": 0.3, "Runups": 0.2, "Deposits": 0.1}
+
+
 def scenario_from_user_inputs(magnitude, max_height, runups, deposits, df):
     """Generate a new scenario row from user-provided inputs."""
     scenario = {
@@ -48,24 +63,40 @@ def scenario_from_user_inputs(magnitude, max_height, runups, deposits, df):
     return pd.concat([df, pd.DataFrame([scenario])], ignore_index=True)
 
 
-def compute_damage_score(df: pd.DataFrame) -> pd.DataFrame:
-    """Compute damage score as a normalized weighted sum of tsunami variables."""
-    weights = {"Magnitude": 0.4, "Max Water Height (m)": 0.3, "Runups": 0.2, "Deposits": 0.1}
-    df = df.copy()
+def fit_damage_bounds(chunks) -> pd.DataFrame:
+    """Accumulate per-feature min/max over an iterable of DataFrames (e.g. load_data(..., chunksize=...))."""
+    bounds = None
+    for chunk in chunks:
+        stats = chunk.reindex(columns=list(DAMAGE_WEIGHTS)).agg(["min", "max"])
+        if bounds is None:
+            bounds = stats
+        else:
+            # fmin/fmax skip NaN like pandas' min/max, so all-NaN chunks don't poison the result
+            bounds.loc["min"] = np.fmin(bounds.loc["min"], stats.loc["min"])
+            bounds.loc["max"] = np.fmax(bounds.loc["max"], stats.loc["max"])
+    return bounds
 
-    # Normalize features to prevent scale bias
-    for key in weights.keys():
-        if key in df.columns:
-            df[key] = (df[key] - df[key].min()) / (df[key].max() - df[key].min() + 1e-9)
 
-    df["Damage Score"] = (
-        weights["Magnitude"] * df["Magnitude"]
-        + weights["Max Water Height (m)"] * df["Max Water Height (m)"]
-        + weights["Runups"] * df["Runups"]
-        + weights["Deposits"] * df["Deposits"]
-    )
+def compute_damage_score(df: pd.DataFrame, bounds: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Compute damage score as a normalized weighted sum of tsunami variables.
 
-    return df
+    Returns a new frame with a "Damage Score" column; the feature columns keep their raw values.
+    bounds (from fit_damage_bounds) normalizes against precomputed min/max instead of
+    df's own, so chunks of a large file score the same as the file read whole.
+    """
+    weights = DAMAGE_WEIGHTS
+    cols = list(weights)
+    X = df[cols].to_numpy(dtype=float)
+
+    # Normalize features to prevent scale bias (one min/max pass over all feature columns)
+    stats = df[cols].agg(["min", "max"]) if bounds is None else bounds[cols]
+    mins = stats.loc["min"].to_numpy(dtype=float)
+    maxs = stats.loc["max"].to_numpy(dtype=float)
+    X_n = (X - mins) / (maxs - mins + 1e-9)
+
+    # Weighted sum, added left to right like the per-column expression it replaces
+    score = (X_n * np.array(list(weights.values()))).sum(axis=1)
+    return df.assign(**{"Damage Score": score})
 
 
 def estimate_loss_from_score(score: float, total_exposed: float = 1e9, calibration_factor: float = 0.75) -> float:
@@ -77,28 +108,79 @@ def estimate_loss_from_score(score: float, total_exposed: float = 1e9, calibrati
 # 3. Model Diagnostics & Statistical Analyses
 # ==========================================================
 
+# id(df) -> (weakref to df, fingerprint, {name: result}) for statistics reused across reruns
+_STATS_CACHE = {}
+
+
+def _fingerprint(df: pd.DataFrame):
+    """Cheap signature of a frame: shape, column names and a hash of a few evenly spaced rows."""
+    sample = df.iloc[np.linspace(0, len(df) - 1, min(len(df), 16), dtype=np.intp)]
+    return df.shape, tuple(df.columns), int(pd.util.hash_pandas_object(sample).sum())
+
+
+def _cached_stat(df: pd.DataFrame, name: str, compute):
+    """Return compute(df), memoized per frame until its fingerprint changes."""
+    key = id(df)
+    fp = _fingerprint(df)
+    entry = _STATS_CACHE.get(key)
+    if entry is None or entry[0]() is not df or entry[1] != fp:
+        entry = (weakref.ref(df, lambda _, key=key: _STATS_CACHE.pop(key, None)), fp, {})
+        _STATS_CACHE[key] = entry
+    results = entry[2]
+    if name not in results:
+        results[name] = compute(df)
+    return results[name].copy()
+
+
 def model_diagnostics(df: pd.DataFrame):
     """Return descriptive statistics and correlation with damage score."""
-    desc = df.describe()
-    correlations = df.corr(numeric_only=True)["Damage Score"].sort_values(ascending=False)
+    desc = _cached_stat(df, "describe", pd.DataFrame.describe)
+    correlations = get_correlation_matrix(df)["Damage Score"].sort_values(ascending=False)
     return desc, correlations
 
 
-def sensitivity_analysis(df: pd.DataFrame, idx: int):
+def sensitivity_analysis(df: pd.DataFrame, idx: int, mode: str = "analytic"):
     """
     Compute sensitivity of the damage score to small perturbations
     in each input parameter for a single scenario.
+
+    The score is a weighted sum of min-max normalized columns, so by default the
+    closed-form derivative weight / (max - min + 1e-9) is returned; it is the same for
+    every row. mode="numeric" perturbs the row and rescores it instead (the whole frame
+    only when the perturbation moves a column's min or max).
     """
+    if mode == "analytic":
+        return {
+            col: weight / (df[col].max() - df[col].min() + 1e-9)
+            for col, weight in DAMAGE_WEIGHTS.items()
+            if col in df.columns
+        }
+    if mode != "numeric":
+        raise ValueError(f"Unknown sensitivity mode: {mode!r}")
+
     base = df.iloc[idx].copy()
+    label = df.index[idx]
+    cols = list(DAMAGE_WEIGHTS)
+    stats = df[cols].agg(["min", "max"])
+    mins = stats.loc["min"].to_numpy(dtype=float)
+    maxs = stats.loc["max"].to_numpy(dtype=float)
+    w = np.array(list(DAMAGE_WEIGHTS.values()))
+    x = base[cols].to_numpy(dtype=float)
     results = {}
-    for col in ["Magnitude", "Max Water Height (m)", "Runups", "Deposits"]:
-        if col in df.columns:
+    for j, col in enumerate(cols):
+        perturb = 0.1 * (base[col] if base[col] != 0 else 1)
+        x_p = x.copy()
+        x_p[j] += perturb
+        if mins[j] < x[j] < maxs[j] and mins[j] <= x_p[j] <= maxs[j]:
+            # Other rows hold this column's min and max, so only this row's score changes;
+            # rescore it alone with the same arithmetic as compute_damage_score
+            new_score = ((x_p - mins) / (maxs - mins + 1e-9) * w).sum()
+        else:
+            # The perturbation moves a column bound, which renormalizes every row
             df_temp = df.copy()
-            perturb = 0.1 * (base[col] if base[col] != 0 else 1)
-            df_temp.loc[idx, col] += perturb
-            new_df = compute_damage_score(df_temp)
-            delta_score = new_df.loc[idx, "Damage Score"] - base["Damage Score"]
-            results[col] = delta_score / perturb
+            df_temp.loc[label, col] += perturb
+            new_score = compute_damage_score(df_temp).loc[label, "Damage Score"]
+        results[col] = (new_score - base["Damage Score"]) / perturb
     return results
 
 
@@ -134,17 +216,24 @@ def compare_scenarios(df: pd.DataFrame, idx1: int, idx2: int) -> pd.Series:
 
 def get_correlation_matrix(df: pd.DataFrame):
     """Return numeric correlation matrix for plotting heatmaps."""
-    return df.corr(numeric_only=True)
+    return _cached_stat(df, "corr", lambda d: d.corr(numeric_only=True))
 
 def damage_vs_parameter(df: pd.DataFrame, param: str):
     """Return parameter values and corresponding damage scores for trend visualization."""
     return df[param], df["Damage Score"]
 
-def sensitivity_dataframe(df: pd.DataFrame):
+def sensitivity_dataframe(df: pd.DataFrame, mode: str = "analytic"):
     """Compute sensitivity for all scenarios and return as a DataFrame."""
+    if mode == "analytic":
+        # The analytic sensitivities don't depend on the row, so compute the spans once and broadcast
+        n = len(df)
+        result = pd.DataFrame({col: np.full(n, sens) for col, sens in sensitivity_analysis(df, 0).items()})
+        result["Scenario"] = np.arange(n)
+        return result
+
     sensitivities = []
     for i in range(len(df)):
-        sa = sensitivity_analysis(df, i)
+        sa = sensitivity_analysis(df, i, mode=mode)
         sa["Scenario"] = i
         sensitivities.append(sa)
     return pd.DataFrame(sensitivities)
@@ -154,9 +243,12 @@ def sensitivity_dataframe(df: pd.DataFrame):
 # ==========================================================
 
 def save_results(df: pd.DataFrame, output_path: str = "output.json"):
-    """Save results as JSON."""
+    """Save results as JSON, or as compressed Parquet if output_path ends in ".parquet"."""
     try:
-        df.to_json(output_path, orient="records", indent=2)
+        if output_path.endswith(".parquet"):
+            df.to_parquet(output_path, compression="zstd")
+        else:
+            df.to_json(output_path, orient="records", indent=2)
         print(f"Results saved to {output_path}")
     except Exception as e:
         print("Error saving results:", e)
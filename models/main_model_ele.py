@@ -7,6 +7,7 @@ import matplotlib.pyplot as plt
 import folium
 from folium.plugins import MarkerCluster
 import json
+from functools import lru_cache
 
 # --- CONFIG / DEFAULTS ---
 DEFAULT_INPUT = "world_tsunamis.csv"
@@ -49,18 +50,26 @@ CITY_NAME_TO_KEY = {
     "london, uk": "london_uk",
     "dubai, uae": "dubai_uae",
 }
+# Case-folded lookup built once at import, so user input only needs str.casefold()
+_CITY_INDEX = {name.casefold(): key for name, key in CITY_NAME_TO_KEY.items()}
 
 
 # --- UTILITY FUNCTIONS ---
 
+@lru_cache(maxsize=4)
+def _read_vulnerability_json(path, mtime_ns):
+    # mtime_ns is only part of the cache key: regenerating the file invalidates the entry
+    with open(path, 'r') as f:
+        return json.load(f)
+
 def load_vulnerability_data(path):
-    """Loads the city vulnerability factors from the pre-computed JSON file."""
+    """Loads the city vulnerability factors from the pre-computed JSON file (parsed once per file version)."""
     if not os.path.exists(path):
         print(f"WARNING: Vulnerability data not found at {path}. Using neutral factor (1.0) for all cities.")
         return {}
     try:
-        with open(path, 'r') as f:
-            return json.load(f)
+        # copy so callers can't modify the cached mapping
+        return dict(_read_vulnerability_json(path, os.stat(path).st_mtime_ns))
     except Exception as e:
         print(f"ERROR reading vulnerability data: {e}. Using neutral factor (1.0).")
         return {}
@@ -74,11 +83,47 @@ def load_data(path=DEFAULT_INPUT):
     print("Data loaded. Rows:", len(df))
     return df
 
-def normalize_series(s):
-    # (Unchanged normalize_series function)
-    if s.max() == s.min():
-        return np.zeros_like(s, dtype=float)
-    return (s - s.min()) / (s.max() - s.min())
+# Order of the weights / feature columns in the scoring arrays
+WEIGHT_KEYS = ("magnitude", "max_height", "runups", "deposits", "city_amp")
+# Historical hazard columns the scenario is normalized against
+HAZARD_COLS = ["Earthquake Magnitude", "Maximum Water Height (m)", "Number of Runups", "Deposits"]
+
+
+def _normalization_stats(df, cols):
+    """Per-column (min, max) arrays from one pass over df; missing columns give NaN."""
+    stats = df.reindex(columns=cols).agg(["min", "max"])
+    return stats.loc["min"].to_numpy(dtype=float), stats.loc["max"].to_numpy(dtype=float)
+
+def _normalize(X, mins, maxs):
+    # Min-max normalize the last axis of X; constant columns (zero span) normalize to 0
+    span = maxs - mins
+    constant = span == 0
+    X_n = (X - mins) / np.where(constant, 1.0, span)
+    X_n[..., constant] = 0.0
+    return X_n
+
+def _score_features(X, mins, maxs):
+    # X is ordered as WEIGHT_KEYS: min-max normalize the hazard features against mins/maxs;
+    # the City Factor (last) is already a 0-1 vulnerability score and is only clipped
+    X_n = np.empty_like(X)
+    X_n[..., :-1] = _normalize(X[..., :-1], mins, maxs)
+    np.clip(X[..., -1], 0.0, 1.0, out=X_n[..., -1])
+    return X_n
+
+def _weighted_score(X_n, weights):
+    w = np.array([weights.get(k, 0.0) for k in WEIGHT_KEYS])
+    # accumulate column by column, left to right: no (n, 5) temporary, and the same rounding
+    # as (X_n * w).sum(-1) for both a frame and a single scenario row
+    score = X_n[..., 0] * w[0]
+    for j in range(1, len(w)):
+        score += X_n[..., j] * w[j]
+
+    # Normalize weights to sum to 1 if they don't, to ensure score is 0-1
+    total_w = sum(weights.values())
+    if total_w > 0:
+        score = score / total_w
+
+    return np.clip(score, 0.0, 1.0)
 
 # MODIFIED: Added city_amp_col to scoring
 def compute_damage_score(df, weights=None,
@@ -95,43 +140,23 @@ def compute_damage_score(df, weights=None,
         if col not in df.columns:
             raise KeyError(f"Missing required column in data: {col}")
 
-    df = df.copy()
-    
     # 1. Handle missing City Factor column (e.g., in historical data)
+    new_cols = {}
     if city_amp_col not in df.columns:
         # For historical data, set factor to 0 (since it shouldn't apply to global events)
-        df[city_amp_col] = 0.0
-        
-    # 2. Normalize hazard features
-    df["_mag_n"] = normalize_series(df[mag_col].astype(float))
-    df["_h_n"] = normalize_series(df[height_col].astype(float))
-    df["_r_n"] = normalize_series(df[runups_col].astype(float))
-    df["_d_n"] = normalize_series(df[deposits_col].astype(float))
-    
-    # 3. Normalize the City Factor (If all values are 0.0, normalization returns 0.0, which is fine)
-    df["_city_n"] = normalize_series(df[city_amp_col].astype(float))
-
-    # 4. Compute composite score (Weight sum is assumed to be 1.0 or weights will be renormalized in post-processing)
-    score = (
-        weights.get("magnitude", 0.0) * df["_mag_n"] +
-        weights.get("max_height", 0.0) * df["_h_n"] +
-        weights.get("runups", 0.0) * df["_r_n"] +
-        weights.get("deposits", 0.0) * df["_d_n"] +
-        weights.get("city_amp", 0.0) * df["_city_n"] # NEW: Include weighted city factor
-    )
-    
-    # Normalize weights to sum to 1 if they don't, to ensure score is 0-1
-    total_w = sum(weights.values())
-    if total_w > 0:
-        score = score / total_w
-    
-    score = np.clip(score, 0.0, 1.0)
-    
-    df["Damage Score"] = score
-    # Remove aux cols
-    aux_cols = ["_mag_n","_h_n","_r_n","_d_n", "_city_n"]
-    df = df.drop(columns=aux_cols, errors='ignore')
-    return df
+        new_cols[city_amp_col] = 0.0
+
+    # 2. Normalize the hazard features in one pass over an (n, 5) array, keeping the City Factor's absolute scale
+    cols = [mag_col, height_col, runups_col, deposits_col, city_amp_col]
+    feats = df.reindex(columns=cols, fill_value=0.0)
+    mins, maxs = _normalization_stats(feats, cols[:-1])
+    X_n = _score_features(feats.to_numpy(dtype=float), mins, maxs)
+
+    # 3. Compute composite score (Weight sum is assumed to be 1.0 or weights will be renormalized in post-processing)
+    new_cols["Damage Score"] = _weighted_score(X_n, weights)
+
+    # a single copy of df with the new columns appended
+    return df.assign(**new_cols)
 
 # MODIFIED: Added city_amp_factor argument
 def scenario_from_user_inputs(magnitude, max_height, runups, deposits, city_amp_factor, df_template):
@@ -142,22 +167,27 @@ def scenario_from_user_inputs(magnitude, max_height, runups, deposits, city_amp_
     deposits_col = "Deposits"
     city_amp_col = "City Factor" 
 
-    newrow = {
-        mag_col: magnitude, 
-        height_col: max_height, 
-        runups_col: runups, 
-        deposits_col: deposits,
-        city_amp_col: city_amp_factor
-    }
-    
-    cols_to_keep = [mag_col, height_col, runups_col, deposits_col]
-    if city_amp_col in df_template.columns:
-        cols_to_keep.append(city_amp_col)
-    
-    df_temp = df_template[cols_to_keep].copy()
-    newrow_df = pd.DataFrame([newrow])
-    df_temp = pd.concat([df_temp, newrow_df], ignore_index=True)
-    return df_temp, len(df_temp) - 1 
+    newrow = [magnitude, max_height, runups, deposits, city_amp_factor]
+    cols = [mag_col, height_col, runups_col, deposits_col, city_amp_col]
+    if city_amp_col not in df_template.columns:
+        # the template rows get NaN, as pd.concat would give them
+        df_template = df_template.assign(**{city_amp_col: np.nan})
+
+    # Stack the new row under the feature array rather than concatenating DataFrames
+    X = np.vstack([df_template[cols].to_numpy(dtype=float), newrow])
+    return pd.DataFrame(X, columns=cols), len(X) - 1
+
+def score_scenario(values, weights, mins, maxs):
+    """
+    Score one scenario (values ordered as WEIGHT_KEYS) against a dataset's hazard-feature
+    normalization stats, exactly as if it had been appended to that dataset and the whole
+    frame rescored.
+    """
+    values = np.asarray(values, dtype=float)
+    # appending the row can only widen each column's range (fmin/fmax skip NaN like pandas)
+    mins = np.fmin(mins, values[:-1])
+    maxs = np.fmax(maxs, values[:-1])
+    return float(_weighted_score(_score_features(values, mins, maxs), weights))
 
 def estimate_loss_from_score(score, total_exposed_value_usd, calibration_factor=1.0):
     # (Unchanged estimate_loss_from_score function)
@@ -169,32 +199,33 @@ def estimate_loss_from_score(score, total_exposed_value_usd, calibration_factor=
 # _find_lat_lon_cols, _haversine_km, find_nearest_location, find_location_by_name are omitted for brevity)
 
 # --- LOCATION FOCUSED REPORT (Copied from original) ---
-def generate_location_report(args, df_scores, weights, vulnerability_factors):
+def _sorted_scores(df):
+    # sorted non-NaN Damage Scores, so percentile lookups are a binary search
+    return np.sort(df["Damage Score"].dropna().to_numpy(dtype=float))
+
+def generate_location_report(args, df_scores, weights, vulnerability_factors, hazard_stats=None, sorted_scores=None):
     """Given args with city name, produce a human-readable report."""
-    lat_col, lon_col = _find_lat_lon_cols(df_scores)
-    
     # 1. Determine City Factor
-    city_key = CITY_NAME_TO_KEY.get(args.location_name.lower())
-    if city_key and city_key in vulnerability_factors:
-        city_amp_factor = vulnerability_factors[city_key]
+    city_key = _CITY_INDEX.get(args.location_name.casefold())
+    city_amp_factor = vulnerability_factors.get(city_key) if city_key else None
+    if city_amp_factor is not None:
         print(f"Using Elevation Vulnerability Factor for {args.location_name}: {city_amp_factor:.4f}")
     else:
         city_amp_factor = 0.0 # Neutral or lowest factor if not found in geospatial data
         print(f"Warning: City '{args.location_name}' not found in vulnerability data. Using neutral factor (0.0).")
 
-    # 2. Prepare the synthetic scenario based on hazard inputs and the derived City Factor
-    df_template = df_scores
-    df_temp, idx_in_temp = scenario_from_user_inputs(
-        args.magnitude, args.max_height, args.runups, args.deposits, 
-        city_amp_factor, df_template
+    # 2. Score the synthetic scenario (hazard inputs + derived City Factor) against the
+    # dataset's normalization stats, without appending it to a copy of the dataset
+    mins, maxs = hazard_stats if hazard_stats is not None else _normalization_stats(df_scores, HAZARD_COLS)
+    score = score_scenario(
+        [args.magnitude, args.max_height, args.runups, args.deposits, city_amp_factor],
+        weights, mins, maxs
     )
-    df_temp_scored = compute_damage_score(df_temp, weights=weights)
-    scenario_row = df_temp_scored.iloc[idx_in_temp]
-    score = float(scenario_row["Damage Score"])
 
     # 3. Compute metrics and loss
-    base_scores = df_scores["Damage Score"].dropna().astype(float)
-    percentile = 100.0 * (base_scores < score).sum() / max(1, len(base_scores))
+    if sorted_scores is None:
+        sorted_scores = _sorted_scores(df_scores)
+    percentile = 100.0 * np.searchsorted(sorted_scores, score, side="left") / max(1, len(sorted_scores))
     est_loss = estimate_loss_from_score(score, args.total_exposed_value_usd, args.calibration_factor)
 
     # 4. Build human-readable output
@@ -232,6 +263,15 @@ def generate_location_report(args, df_scores, weights, vulnerability_factors):
 
 
 # ---------- MAIN PIPELINE (UPDATED) ----------
+@lru_cache(maxsize=8)
+def _scored_historical(path, mtime_ns, weight_items):
+    # Historical scores only depend on the CSV and the weights, so repeated runs reuse them
+    # (mtime_ns only keys the cache, so an edited CSV is rescored). The hazard normalization stats
+    # and sorted scores are cached alongside so reports don't rescan the frame. Callers must not
+    # modify the frame.
+    df_scores = compute_damage_score(load_data(path), weights=dict(weight_items))
+    return df_scores, _normalization_stats(df_scores, HAZARD_COLS), _sorted_scores(df_scores)
+
 def run_pipeline(args):
     # Step 1: Run geospatial processor (or load simulated output)
     if not os.path.exists(VULNERABILITY_FILE):
@@ -243,10 +283,7 @@ def run_pipeline(args):
 
     vulnerability_factors = load_vulnerability_data(VULNERABILITY_FILE)
     
-    # Step 2: Load Tsunami Historical Data
-    df = load_data(args.input_csv)
-
-    # Step 3: Compute scores
+    # Step 2/3: Load Tsunami Historical Data and compute scores
     weights = {
         "magnitude": args.w_magnitude,
         "max_height": args.w_max_height,
@@ -256,7 +293,8 @@ def run_pipeline(args):
     }
     
     # We use a neutral data frame for computing historical scores (City Factor column = 0.0)
-    df_scores = compute_damage_score(df, weights=weights)
+    mtime_ns = os.stat(args.input_csv).st_mtime_ns if os.path.exists(args.input_csv) else None
+    df_scores, hazard_stats, sorted_scores = _scored_historical(args.input_csv, mtime_ns, tuple(weights.items()))
 
     out_prefix = args.out_prefix or "tsunami_model"
 
@@ -267,7 +305,7 @@ def run_pipeline(args):
     elif args.mode == "synthetic":
         # MODIFIED: Focus only on location-based synthetic reports now
         if args.location_name:
-            generate_location_report(args, df_scores, weights, vulnerability_factors)
+            generate_location_report(args, df_scores, weights, vulnerability_factors, hazard_stats, sorted_scores)
         else:
             print("\nError: In synthetic mode, you must specify --location_name with the new model.")
             print("Available cities:", ", ".join(CITY_NAME_TO_KEY.keys()))
@@ -1,11 +1,14 @@
 import geopandas as gpd
+import shapely
 from shapely.geometry import shape
 
 def predict_damage(flood_geojson, buildings_gdf, avg_value=80000, vuln=0.3, depth=None, severity='moderate'):
     flood_poly = shape(flood_geojson['features'][0]['geometry'])
-    # intersect
-    affected = buildings_gdf[buildings_gdf.intersects(flood_poly)]
-    N = len(affected)
+    # intersect: bbox candidates from the spatial index (built once and cached on the frame),
+    # then one vectorized exact test against the prepared polygon
+    candidates = buildings_gdf.geometry.values[buildings_gdf.sindex.query(flood_poly)]
+    shapely.prepare(flood_poly)
+    N = int(shapely.intersects(candidates, flood_poly).sum())
     depth_factor = 0.5
     if depth is not None:
         depth_factor = min(1.0, depth / 2.0)